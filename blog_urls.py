@@ -0,0 +1,297 @@
+"""ブログURLの抽出とURLインデックス
+
+知識ベースの取り込み時に本文からURLを一度だけ抽出し、
+URL → 出典ファイル・カテゴリ・タイトルのインデックスを作ります。
+質問ごとの処理はインデックスの参照のみで、知識ベースの大きさに依存しません。
+
+使い方:
+    python blog_urls.py bench   # 知識ベースの大きさごとの1リクエストあたりの処理時間
+"""
+import os
+import re
+import time
+import bisect
+import argparse
+import functools
+
+from category_classifier import category_from_filename
+
+# ブログURLのパターン（https://camper-repair.net/で始まるURL）
+URL_PATTERN = re.compile(r'https://camper-repair\.net/[^\s,、，。]+')
+
+
+@functools.lru_cache(maxsize=4096)
+def extract_title_from_url(url):
+    """URLから適切なタイトルを抽出"""
+    # URLのパス部分を取得
+    path = url.split('/')
+    
+    # 最後の部分（ファイル名）を取得
+    filename = path[-1] if path[-1] else path[-2] if len(path) > 1 else ""
+    
+    # ファイル名から拡張子を除去
+    if '.' in filename:
+        filename = filename.split('.')[0]
+    
+    # ハイフンやアンダースコアをスペースに変換
+    title = filename.replace('-', ' ').replace('_', ' ')
+    
+    # カテゴリ別のタイトルマッピング
+    title_mapping = {
+        'ff': 'FFヒーターの修理方法',
+        'rain': '雨漏りの対処法と修理',
+        'inverter': 'インバーターの故障と修理',
+        'electrical': '電気系統のトラブル対処',
+        'battery': 'バッテリーの故障と交換',
+        'water': '水道ポンプの修理方法',
+        'gas': 'ガスコンロの点火トラブル',
+        'refrigerator': '冷蔵庫の故障と修理',
+        'toilet': 'トイレの故障と修理',
+        'solar': 'ソーラーパネルの設置と修理',
+        'furniture': '家具の修理とメンテナンス',
+        'vent': '換気扇の故障と修理',
+        'window': '窓の修理と交換',
+        'exterior': '車体外装の修理',
+        'noise': '異音の原因と対処法'
+    }
+    
+    # キーワードに基づいてタイトルを決定
+    for keyword, mapped_title in title_mapping.items():
+        if keyword in url.lower():
+            return mapped_title
+    
+    # デフォルトのタイトル生成
+    if title:
+        # 各単語の最初の文字を大文字に
+        title = ' '.join(word.capitalize() for word in title.split())
+        return f"{title}の修理方法"
+    
+    return "キャンピングカー修理情報"
+
+def categorize_blog_urls(urls):
+    """ブログURLをカテゴリ別に分類"""
+    categories = {
+        "FFヒーター": [],
+        "雨漏り": [],
+        "外部電源": [],
+        "その他": []
+    }
+    
+    for url in urls:
+        categories[blog_url_group(url)].append(url)
+    
+    return categories
+
+@functools.lru_cache(maxsize=4096)
+def blog_url_group(url):
+    """categorize_blog_urlsの分類先"""
+    url_lower = url.lower()
+    if "ff" in url_lower:
+        return "FFヒーター"
+    elif "rain" in url_lower:
+        return "雨漏り"
+    elif "inverter" in url_lower or "electrical" in url_lower:
+        return "外部電源"
+    return "その他"
+
+
+class UrlIndex:
+    """URL → 出典ファイル・カテゴリ・タイトルのインデックス"""
+
+    def __init__(self, url_pattern=URL_PATTERN):
+        self.url_pattern = url_pattern
+        self.urls = {}
+        # カテゴリ → そのカテゴリのファイルの先頭URL（複数ファイルある場合は後のファイル）
+        self.category_urls = {}
+        # 先頭URLを登録済みの(カテゴリ, ファイル)
+        self._first_url_sources = set()
+        # related_urlsで使う検索用のデータ（URLが追加されたら作り直す）
+        self._search = None
+
+    def add(self, text, metadata):
+        """チャンクの本文からURLを抽出して登録"""
+        found_urls = self.url_pattern.findall(text)
+        if not found_urls:
+            return
+        source = metadata.get('source', '')
+        category = metadata.get('category') or category_from_filename(os.path.basename(source))
+        for url in found_urls:
+            entry = self.urls.get(url)
+            if entry is None:
+                self._search = None
+                entry = self.urls[url] = {
+                    'sources': set(),
+                    'category': category,
+                    'title': extract_title_from_url(url),
+                    'group': blog_url_group(url),
+                    'lower': url.lower(),
+                }
+            entry['sources'].add(source)
+        # ファイルの2つ目以降のチャンクのURLでは上書きしない
+        if category and (category, source) not in self._first_url_sources:
+            self._first_url_sources.add((category, source))
+            self.category_urls[category] = found_urls[0]
+
+    @classmethod
+    def from_documents(cls, documents, url_pattern=URL_PATTERN):
+        index = cls(url_pattern)
+        for doc in documents:
+            index.add(doc.page_content, doc.metadata)
+        return index
+
+    def _search_data(self):
+        # (URLのリスト, 小文字のURLを改行で連結した文字列, 各URLの開始位置)
+        search = self._search
+        if search is None:
+            urls = list(self.urls)
+            offsets = []
+            position = 0
+            for url in urls:
+                offsets.append(position)
+                position += len(self.urls[url]['lower']) + 1
+            text = "\n".join(self.urls[url]['lower'] for url in urls)
+            search = self._search = (urls, text, offsets)
+        return search
+
+    def related_urls(self, question=""):
+        """質問の単語を含むURLを先頭にしたURLのリスト"""
+        urls, text, offsets = self._search_data()
+        keywords = question.lower().split()
+        if not keywords:
+            return list(urls)
+
+        # 連結した文字列を検索し、単語を含むURLの番号を求める（単語は改行をまたがない）
+        hits = set()
+        for keyword in keywords:
+            start = text.find(keyword)
+            while start != -1:
+                index = bisect.bisect_right(offsets, start) - 1
+                hits.add(index)
+                if index + 1 >= len(offsets):
+                    break
+                start = text.find(keyword, offsets[index + 1])
+
+        if not hits:
+            return list(urls)
+        relevant_urls = [urls[i] for i in sorted(hits)]
+        other_urls = [url for i, url in enumerate(urls) if i not in hits]
+        return relevant_urls + other_urls
+
+
+class KnowledgeBase:
+    """取り込んだチャンクのリストと、取り込み時に作ったURLインデックス
+
+    チャンクの追加はappend・extend・+=のみで、必ずURLインデックスにも登録する。
+    変更・削除はできない（スライスはインデックスを持たないリストを返す）。
+    """
+
+    def __init__(self, documents=(), url_pattern=URL_PATTERN):
+        self._documents = []
+        self.url_index = UrlIndex(url_pattern)
+        self.extend(documents)
+
+    def append(self, doc):
+        self._documents.append(doc)
+        self.url_index.add(doc.page_content, doc.metadata)
+
+    def extend(self, documents):
+        for doc in documents:
+            self.append(doc)
+
+    def __iadd__(self, documents):
+        self.extend(documents)
+        return self
+
+    def __getitem__(self, index):
+        return self._documents[index]
+
+    def __iter__(self):
+        return iter(self._documents)
+
+    def __len__(self):
+        return len(self._documents)
+
+    def __repr__(self):
+        return f"KnowledgeBase({len(self._documents)} chunks, {len(self.url_index.urls)} urls)"
+
+
+def url_index_for(documents, url_pattern=URL_PATTERN):
+    """documentsのURLインデックス（取り込み時に作られていなければその場で作成）"""
+    index = getattr(documents, 'url_index', None)
+    if index is None:
+        index = UrlIndex.from_documents(documents, url_pattern)
+    return index
+
+
+# === ベンチマーク ===
+def _scan_category_urls(documents):
+    """比較用：従来の方法で全文書を正規表現で走査（関連ブログカード）"""
+    actual_urls = {}
+    for doc in documents:
+        found_urls = re.findall(URL_PATTERN.pattern, doc.page_content)
+        if found_urls and doc.metadata.get('category'):
+            actual_urls[doc.metadata['category']] = found_urls[0]
+    return actual_urls
+
+
+def _scan_related_urls(documents, question):
+    """比較用：従来の方法で全文書を正規表現で走査（extract_blog_urls）"""
+    urls = set()
+    for doc in documents:
+        urls.update(re.findall(URL_PATTERN.pattern, doc.page_content))
+    keywords = question.lower().split()
+    relevant_urls = [url for url in urls if any(keyword in url.lower() for keyword in keywords)]
+    other_urls = [url for url in urls if not any(keyword in url.lower() for keyword in keywords)]
+    return relevant_urls + other_urls
+
+
+def _with_distinct_urls(documents, copy):
+    """文書を複製し、URLの末尾に複製番号を付けて別のURLにする"""
+    class Doc:
+        __slots__ = ('page_content', 'metadata')
+
+        def __init__(self, page_content, metadata):
+            self.page_content = page_content
+            self.metadata = metadata
+
+    if copy == 0:
+        return list(documents)
+    suffix = f"copy{copy}/"
+    return [Doc(URL_PATTERN.sub(lambda m: m.group(0).rstrip('/') + '/' + suffix, doc.page_content), doc.metadata)
+            for doc in documents]
+
+
+def _per_request_ms(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def benchmark(documents, sizes=(1, 10, 100), repeat=20, question="冷蔵庫 refrigerator が冷えない"):
+    """知識ベースを別々のURLを持つ文書で大きくし、1リクエストあたりのURL抽出時間を比較"""
+    for size in sizes:
+        scaled = [doc for copy in range(size) for doc in _with_distinct_urls(documents, copy)]
+        index = url_index_for(KnowledgeBase(scaled))
+
+        scan_cards = _per_request_ms(lambda: _scan_category_urls(scaled), repeat)
+        index_cards = _per_request_ms(lambda: dict(index.category_urls), repeat)
+        scan_related = _per_request_ms(lambda: _scan_related_urls(scaled, question), repeat)
+        index_related = _per_request_ms(lambda: index.related_urls(question), repeat)
+
+        print(f"x{size:<4d} {len(scaled):7d} chunks, {len(index.urls):6d} urls: "
+              f"cards scan {scan_cards:9.3f} / index {index_cards:.4f} ms | "
+              f"related_urls scan {scan_related:9.3f} / index {index_related:.4f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="URLインデックスのベンチマーク")
+    parser.add_argument("command", choices=["bench"])
+    args = parser.parse_args()
+
+    from ingest import load_documents
+    benchmark(load_documents())
+
+
+if __name__ == "__main__":
+    main()
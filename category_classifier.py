@@ -0,0 +1,313 @@
+"""質問→カテゴリ分類器（関連ブログの選択と検索対象の絞り込みに使用）
+
+キーワードのAho-Corasickオートマトンで判定し、キーワードが見つからない場合は
+シナリオファイルから学習した線形分類器（NumPy配列で保存）で推定します。
+
+使い方:
+    python category_classifier.py train   # シナリオファイルから線形分類器を学習
+    python category_classifier.py bench   # 精度とレイテンシを計測
+    python category_classifier.py train --tenant <テナントID>   # テナントの知識ベースから学習
+"""
+import os
+import sys
+import zlib
+import time
+import argparse
+import functools
+from collections import deque
+
+import numpy as np
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 学習済み線形分類器の保存先
+MODEL_PATH = os.path.join(APP_DIR, "category_model.npz")
+
+# カテゴリごとのキーワード（順序は同点時の優先順位）
+CATEGORY_KEYWORDS = {
+    '冷蔵庫': ['冷蔵庫', '冷蔵', '冷凍', '冷えない', 'コンプレッサ'],
+    'ffヒーター': ['ffヒーター', 'ff', 'ヒーター', '暖房', '暖かい', '温風'],
+    '雨漏り': ['雨漏り', '雨', '漏水', '水漏れ', '湿気', '防水'],
+    'バッテリー': ['バッテリー', 'battery', '電源', '充電', '上がり', '電圧'],
+    '水道ポンプ': ['水道ポンプ', '水', 'ポンプ', '給水', '水圧', '蛇口'],
+    'ガスコンロ': ['ガスコンロ', 'ガス', 'コンロ', '点火', '火', '燃焼'],
+    'トイレ': ['トイレ', 'toilet', '便器', '排水', '水洗', '臭い'],
+    'ソーラーパネル': ['ソーラーパネル', 'solar', '太陽光', '発電', '充電', 'パネル'],
+    'インバーター': ['インバーター', 'inverter', '交流', '直流', '変換', '電圧'],
+    '電装系': ['電装', '配線', '電気', 'ショート', '断線', '電圧'],
+    'ルーフベント': ['ルーフベント', '換気扇', '換気', '空気', '風通し'],
+    '家具': ['家具', 'テーブル', '椅子', 'ベッド', '収納', '破損'],
+    '外部電源': ['外部電源', 'コンセント', 'ac', '交流', '充電'],
+    '排水タンク': ['排水タンク', '排水', 'タンク', '水', '配管', '詰まり'],
+    'ウインドウ': ['ウインドウ', '窓', 'window', 'ガラス', '破損'],
+    '車体外装': ['車体', '外装', '破損', '傷', '塗装', '修理'],
+    '異音': ['異音', '音', '騒音', '振動', '故障', '異常'],
+}
+
+# ファイル名からカテゴリを判定する順序
+FILENAME_ORDER = [
+    '水道ポンプ', '冷蔵庫', 'ffヒーター', '雨漏り', 'バッテリー', 'ガスコンロ', 'トイレ',
+    'ソーラーパネル', 'インバーター', '電装系', 'ルーフベント', '家具', '外部電源',
+    '排水タンク', 'ウインドウ', '車体外装', '異音',
+]
+
+# 線形分類器の特徴量の次元数と、採用する最低スコア
+FEATURE_DIM = 4096
+MIN_MODEL_SCORE = 0.15
+
+# ベンチマーク用の評価質問（質問, 正解カテゴリ）
+EVAL_QUESTIONS = [
+    ("冷蔵庫が冷えない時の修理方法は？", '冷蔵庫'),
+    ("FFヒーターが点かない", 'ffヒーター'),
+    ("天井から雨漏りしています", '雨漏り'),
+    ("バッテリーが上がってエンジンが始動しない時の対処法を教えてください", 'バッテリー'),
+    ("水道ポンプから水が出ない時の修理方法は？", '水道ポンプ'),
+    ("ガスコンロが点火しない時の対処法を教えてください", 'ガスコンロ'),
+    ("トイレの便器から臭いがする", 'トイレ'),
+    ("ソーラーパネルで発電しない", 'ソーラーパネル'),
+    ("インバーターの選び方を知りたい", 'インバーター'),
+    ("配線がショートしたかもしれない", '電装系'),
+    ("ルーフベントの換気扇が回らない", 'ルーフベント'),
+    ("テーブルの脚が破損した", '家具'),
+    ("外部電源のコンセントが使えない", '外部電源'),
+    ("排水タンクが詰まりました", '排水タンク'),
+    ("窓ガラスにひびが入った", 'ウインドウ'),
+    ("車体の塗装が剥がれてきた", '車体外装'),
+    ("走行中に異音がする", '異音'),
+]
+
+
+def category_from_filename(filename, names=FILENAME_ORDER):
+    """シナリオファイル名からカテゴリを判定（該当なしはNone）"""
+    lower = filename.lower()
+    for name in names:
+        if name in filename or name in lower:
+            return name
+    return None
+
+
+# === キーワードオートマトン ===
+class KeywordAutomaton:
+    """全カテゴリのキーワードを1回の走査で検出するAho-Corasickオートマトン"""
+
+    def __init__(self, keywords_by_category):
+        self.labels = list(keywords_by_category)
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [()]
+
+        # キーワードのトライを構築
+        for index, label in enumerate(self.labels):
+            for keyword_id, keyword in enumerate(keywords_by_category[label]):
+                state = 0
+                for ch in keyword.lower():
+                    if ch not in self.goto[state]:
+                        self.goto.append({})
+                        self.fail.append(0)
+                        self.output.append(())
+                        self.goto[state][ch] = len(self.goto) - 1
+                    state = self.goto[state][ch]
+                self.output[state] += ((index, keyword_id),)
+
+        # 失敗遷移を幅優先で構築
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.output[nxt] += self.output[self.fail[nxt]]
+
+    def scores(self, text):
+        """カテゴリ→一致したキーワード数（同じキーワードは1回のみ数える）"""
+        goto, fail, output = self.goto, self.fail, self.output
+        found = set()
+        state = 0
+        for ch in text.lower():
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if output[state]:
+                found.update(output[state])
+
+        counts = [0] * len(self.labels)
+        for index, _ in found:
+            counts[index] += 1
+        return {self.labels[i]: c for i, c in enumerate(counts) if c}
+
+
+@functools.lru_cache(maxsize=None)
+def get_automaton():
+    """キーワードオートマトンを取得（初回のみ構築）"""
+    return KeywordAutomaton(CATEGORY_KEYWORDS)
+
+
+# === 線形分類器 ===
+def text_features(text):
+    """文字unigram/bigramをハッシュした特徴量（インデックス配列, 値配列）"""
+    text = text.lower()
+    grams = list(text) + [text[i:i + 2] for i in range(len(text) - 1)]
+    counts = {}
+    for gram in grams:
+        if gram.isspace():
+            continue
+        index = zlib.crc32(gram.encode('utf-8')) % FEATURE_DIM
+        counts[index] = counts.get(index, 0) + 1
+    indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+    values = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+    return indices, values
+
+
+def train_model(samples):
+    """(テキスト, カテゴリ)のリストから重心ベースの線形分類器を学習"""
+    labels = sorted({label for _, label in samples})
+    label_index = {label: i for i, label in enumerate(labels)}
+
+    # IDFを計算
+    document_freq = np.zeros(FEATURE_DIM, dtype=np.float32)
+    features = []
+    for text, label in samples:
+        indices, values = text_features(text)
+        document_freq[indices] += 1
+        features.append((indices, values, label_index[label]))
+    idf = np.log((1 + len(samples)) / (1 + document_freq)).astype(np.float32) + 1
+
+    # カテゴリごとの重心を正規化して重みとする
+    weights = np.zeros((len(labels), FEATURE_DIM), dtype=np.float32)
+    for indices, values, label in features:
+        vector = np.log1p(values) * idf[indices]
+        norm = np.linalg.norm(vector)
+        if norm:
+            weights[label, indices] += vector / norm
+    norms = np.linalg.norm(weights, axis=1, keepdims=True)
+    weights /= np.where(norms == 0, 1, norms)
+
+    return {'weights': weights, 'idf': idf, 'labels': np.array(labels)}
+
+
+def save_model(model, path=MODEL_PATH):
+    np.savez_compressed(path, **model)
+
+
+@functools.lru_cache(maxsize=4)
+def load_model(path=MODEL_PATH):
+    """学習済みの線形分類器を読み込む（ファイルがなければNone）"""
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        return {'weights': data['weights'], 'idf': data['idf'], 'labels': [str(l) for l in data['labels']]}
+
+
+def predict_model(question, model):
+    """線形分類器でカテゴリを推定し、(カテゴリ, スコア)を返す"""
+    indices, values = text_features(question)
+    if not len(indices):
+        return None, 0.0
+    vector = np.log1p(values) * model['idf'][indices]
+    vector /= np.linalg.norm(vector)
+    scores = model['weights'][:, indices] @ vector
+    best = int(scores.argmax())
+    return model['labels'][best], float(scores[best])
+
+
+# === 分類 ===
+def classify(question, top_k=3, model_path=MODEL_PATH, automaton=None):
+    """質問のカテゴリを推定し、スコアの高い順に(カテゴリ, スコア)のリストを返す"""
+    if not question:
+        return []
+
+    keyword_scores = (automaton or get_automaton()).scores(question)
+    if keyword_scores:
+        # 同点の場合はキーワード表の順序を維持
+        ranked = sorted(keyword_scores.items(), key=lambda x: x[1], reverse=True)
+        return ranked[:top_k]
+
+    model = load_model(model_path)
+    if model is None:
+        return []
+    label, score = predict_model(question, model)
+    if label is None or score < MIN_MODEL_SCORE:
+        return []
+    return [(label, score)]
+
+
+# === 学習・ベンチマーク ===
+def training_samples(documents):
+    """シナリオファイルの段落を(テキスト, カテゴリ)の学習データにする"""
+    samples = []
+    for doc in documents:
+        label = doc.metadata.get('category') or category_from_filename(os.path.basename(doc.metadata.get('source', '')))
+        if not label:
+            continue
+        for paragraph in doc.page_content.split('\n\n'):
+            paragraph = paragraph.strip()
+            if len(paragraph) >= 10:
+                samples.append((paragraph, label))
+    return samples
+
+
+def _time_per_call(func, questions, repeat=200):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for question in questions:
+            func(question)
+    return (time.perf_counter() - start) / (repeat * len(questions)) * 1e6
+
+
+def benchmark(model_path=MODEL_PATH, automaton=None):
+    """評価質問での精度と1回あたりの分類時間（マイクロ秒）を表示"""
+    questions = [q for q, _ in EVAL_QUESTIONS]
+    automaton = automaton or get_automaton()
+
+    def top_keyword(question):
+        ranked = classify(question, top_k=1, model_path=model_path, automaton=automaton)
+        return ranked[0][0] if ranked else None
+
+    correct = sum(top_keyword(q) == label for q, label in EVAL_QUESTIONS)
+    print(f"classify       : accuracy {correct}/{len(EVAL_QUESTIONS)}"
+          f"  {_time_per_call(top_keyword, questions):.1f} us/query")
+    print(f"keyword only   : {_time_per_call(automaton.scores, questions):.1f} us/query")
+
+    model = load_model(model_path)
+    if model is None:
+        print("linear model   : 未学習（python category_classifier.py train）")
+        return
+    correct = sum(predict_model(q, model)[0] == label for q, label in EVAL_QUESTIONS)
+    print(f"linear model   : accuracy {correct}/{len(EVAL_QUESTIONS)}"
+          f"  {_time_per_call(lambda q: predict_model(q, model), questions):.1f} us/query")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="質問→カテゴリ分類器の学習とベンチマーク")
+    parser.add_argument("command", choices=["train", "bench"])
+    parser.add_argument("--tenant", default=None, help="テナントID（tenants.json、未指定なら既定のテナント）")
+    parser.add_argument("--model", default=None, help="線形分類器の保存先（未指定ならテナントの保存先）")
+    args = parser.parse_args()
+
+    # tenant_configはこのモジュールを読み込むため、ここで読み込む
+    from tenant_config import DEFAULT_TENANT_ID, load_tenant_configs
+    tenants = load_tenant_configs()
+    tenant_id = args.tenant or DEFAULT_TENANT_ID
+    if tenant_id not in tenants:
+        sys.exit(f"テナントが見つかりません: {tenant_id}")
+    tenant = tenants[tenant_id]
+    model_path = args.model or tenant.category_model_path
+
+    if args.command == "train":
+        from pipeline import load_documents
+        samples = training_samples(load_documents(tenant.kb_path, tenant=tenant))
+        if not samples:
+            sys.exit("学習データがありません（カテゴリ名を含むシナリオファイルが必要です）")
+        os.makedirs(os.path.dirname(model_path), exist_ok=True)
+        save_model(train_model(samples), model_path)
+        load_model.cache_clear()
+        print(f"{len(samples)}件の段落から学習し、{model_path} に保存しました")
+
+    benchmark(model_path, tenant.automaton)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""知識ベースのストリーミング取り込み
+
+ページ読み込み → 整形 → チャンク分割 → インデックス登録 をジェネレーターでつなぎ、
+1ページずつ処理します（後段が次のページを要求するまで読み込まないため、
+取り込み中に保持される元テキストは常に1ページ分のみ）。
+
+使い方:
+    python ingest.py bench   # pages/sec とピークメモリを一括読み込みと比較
+
+    eager  : 従来の一括読み込み（全ページのDocumentを保持）
+    stream : ストリーミング取り込み（検索用のチャンクを保持）
+    scan   : ストリーミング取り込みのみ（チャンクを保持しない＝取り込み処理自体のメモリ）
+"""
+import os
+import re
+import sys
+import glob
+import time
+import argparse
+import subprocess
+
+# Windows互換性のため、個別にインポート
+try:
+    from langchain_community.document_loaders import PyPDFLoader, TextLoader
+except ModuleNotFoundError as e:
+    if "pwd" in str(e):
+        # pwdモジュールエラーの場合、代替手段を使用
+        import platform
+        if platform.system() == "Windows":
+            # Windows環境での代替インポート
+            from langchain_community.document_loaders.pdf import PyPDFLoader
+            from langchain_community.document_loaders.text import TextLoader
+        else:
+            raise e
+    else:
+        raise e
+
+from blog_urls import KnowledgeBase
+from category_classifier import category_from_filename
+from tenant_config import DEFAULT_TENANT
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# チャンクの最大文字数（検索時に使う抜粋の長さに合わせる）
+CHUNK_SIZE = 500
+
+# ファイルが1つも読み込めなかった場合に使うマニュアル
+FALLBACK_PDF = "キャンピングカー修理マニュアル.pdf"
+
+
+def knowledge_base_files(main_path=APP_DIR):
+    """知識ベースとして読み込まれるファイルの一覧"""
+    files = glob.glob(os.path.join(main_path, "*.pdf")) + glob.glob(os.path.join(main_path, "*.txt"))
+    return sorted(files)
+
+
+def _loader(path):
+    if path.lower().endswith(".pdf"):
+        return PyPDFLoader(path)
+    return TextLoader(path, encoding='utf-8')
+
+
+def iter_pages(paths, stats=None):
+    """ファイルを1ページずつ読み込む（読み込めないファイルはスキップ）"""
+    for path in paths:
+        try:
+            for page in _loader(path).lazy_load():
+                if stats is not None:
+                    stats['pages'] += 1
+                yield page
+        except Exception as e:
+            pass
+
+
+def clean_pages(pages):
+    """ページの内容を文字列にし、余分な空白・空行を整理"""
+    for page in pages:
+        text = page.page_content if isinstance(page.page_content, str) else str(page.page_content)
+        text = re.sub(r'[ \t　]+\n', '\n', text)
+        text = re.sub(r'\n\s*\n\s*\n', '\n\n', text)
+        page.page_content = text.strip()
+        yield page
+
+
+def split_text(text, size=CHUNK_SIZE):
+    """テキストを行の区切りでsize文字以下のチャンクに分割"""
+    chunks = []
+    current = ""
+    for line in text.splitlines(keepends=True):
+        # 1行がsizeを超える場合は空白の位置で分割（URLを途中で切らないため）
+        while len(line) > size:
+            cut = max(line.rfind(' ', 0, size), line.rfind('　', 0, size))
+            cut = cut + 1 if cut > 0 else size
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:cut])
+            line = line[cut:]
+        if len(current) + len(line) > size:
+            chunks.append(current)
+            current = ""
+        current += line
+    if current.strip():
+        chunks.append(current)
+    return [chunk.strip() for chunk in chunks if chunk.strip()]
+
+
+class Chunk:
+    """検索インデックスに保持するチャンク
+
+    Documentと同じpage_content・metadataを持つ軽量なオブジェクト。
+    同じページのチャンクはmetadataの辞書を共有する。
+    """
+    __slots__ = ('page_content', 'metadata')
+
+    def __init__(self, page_content, metadata):
+        self.page_content = page_content
+        self.metadata = metadata
+
+    def __repr__(self):
+        return f"Chunk(page_content={self.page_content[:30]!r}, metadata={self.metadata!r})"
+
+
+def chunk_pages(pages, size=CHUNK_SIZE, stats=None, category_names=DEFAULT_TENANT.category_names):
+    """ページをチャンクに分割し、ファイル名からカテゴリを付与（元のページは次の読み込み前に解放）"""
+    for page in pages:
+        metadata = dict(page.metadata)
+        metadata['category'] = category_from_filename(os.path.basename(metadata.get('source', '')), category_names)
+        chunks = split_text(page.page_content, size)
+        del page
+        for chunk in chunks:
+            if stats is not None:
+                stats['chunks'] += 1
+            yield Chunk(chunk, metadata)
+
+
+def iter_documents(main_path=APP_DIR, stats=None, tenant=DEFAULT_TENANT):
+    """知識ベースをチャンク単位で順に返すジェネレーター"""
+    pages = iter_pages(knowledge_base_files(main_path), stats)
+    return chunk_pages(clean_pages(pages), stats=stats, category_names=tenant.category_names)
+
+
+def load_documents(main_path=APP_DIR, stats=None, tenant=DEFAULT_TENANT):
+    """知識ベースを取り込んでチャンクのリスト（検索用インデックス、URLインデックス付き）を返す"""
+    documents = KnowledgeBase(iter_documents(main_path, stats, tenant), tenant.url_pattern)
+
+    if not documents:
+        # マニュアルが読み込めない場合はエラーにする
+        pages = PyPDFLoader(os.path.join(main_path, FALLBACK_PDF)).lazy_load()
+        documents = KnowledgeBase(chunk_pages(clean_pages(pages), stats=stats, category_names=tenant.category_names),
+                                  tenant.url_pattern)
+
+    return documents
+
+
+# === ベンチマーク ===
+def peak_rss_mb():
+    """プロセスのピークRSS（MB、取得できない環境ではNone）"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOSはバイト、Linuxはキロバイト
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _run_mode(mode, main_path):
+    baseline = peak_rss_mb()
+    stats = {'pages': 0, 'chunks': 0}
+    start = time.perf_counter()
+    if mode == "stream":
+        documents = load_documents(main_path, stats)
+    elif mode == "scan":
+        # インデックスを保持せずにパイプラインだけを流す（取り込み処理自体のメモリ）
+        for _ in iter_documents(main_path, stats):
+            pass
+    else:
+        # 比較用：全ページを一度にDocumentとして読み込む従来の方法
+        documents = []
+        for path in knowledge_base_files(main_path):
+            documents.extend(_loader(path).load())
+        stats['pages'] = len(documents)
+        stats['chunks'] = len(documents)
+    elapsed = time.perf_counter() - start
+    peak = peak_rss_mb()
+    rate = stats['pages'] / elapsed if elapsed else 0.0
+    line = f"{mode:6s}: {stats['pages']} pages, {stats['chunks']} chunks, {rate:.1f} pages/sec"
+    if peak is not None:
+        line += f", peak RSS {peak:.1f} MB (+{peak - baseline:.1f} MB)"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="知識ベース取り込みのベンチマーク")
+    parser.add_argument("command", choices=["bench"])
+    parser.add_argument("--path", default=APP_DIR, help="知識ベースのディレクトリ")
+    parser.add_argument("--mode", choices=["eager", "stream", "scan"], help="指定したモードのみ実行")
+    args = parser.parse_args()
+
+    if args.mode:
+        _run_mode(args.mode, args.path)
+        return
+
+    # ピークRSSはプロセス単位のため、モードごとに別プロセスで計測
+    for mode in ("eager", "stream", "scan"):
+        subprocess.run([sys.executable, os.path.abspath(__file__), "bench", "--path", args.path, "--mode", mode],
+                       check=True)
+
+
+if __name__ == "__main__":
+    main()
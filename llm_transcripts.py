@@ -0,0 +1,97 @@
+"""LLM呼び出しの記録と再生
+
+model.invokeに渡したメッセージとパラメータ（model・max_tokens・temperature）のハッシュをキーに、
+応答をJSONファイルに保存します。再生時は保存済みの応答を返すため、APIキーなしで
+同じ回答を再現できます（プロンプトが変わった場合は記録がないためエラーになります）。
+
+    model = TranscriptModel(create_model(api_key), "transcripts.json", mode="record")
+    router = ModelRouter(model)
+"""
+import os
+import json
+import hashlib
+import threading
+
+from langchain_core.messages import AIMessage
+
+# record: 常にLLMを呼び出して記録 / replay: 記録のみ使用 / auto: 記録がなければLLMを呼び出して記録
+MODES = ("record", "replay", "auto")
+
+
+class MissingTranscriptError(KeyError):
+    """再生時に記録が見つからない（プロンプトまたはパラメータが記録時と異なる）"""
+
+
+def transcript_key(messages, params):
+    """メッセージとパラメータからキー（sha256）を計算"""
+    payload = {
+        'messages': [[message.type, message.content] for message in messages],
+        'params': params,
+    }
+    data = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def load_transcripts(path):
+    """記録を読み込む（ファイルがなければ空）"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_transcripts(transcripts, path):
+    """記録を保存（書き込み途中で壊れないよう一時ファイルから置き換え）"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(transcripts, f, ensure_ascii=False, indent=2, sort_keys=True, default=str)
+    os.replace(tmp_path, path)
+
+
+class TranscriptModel:
+    """チャットモデルのinvokeを記録・再生するラッパー（再生のみの場合、modelはNoneでよい）"""
+
+    def __init__(self, model, path, mode="auto"):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}: {mode}")
+        if model is None and mode != "replay":
+            raise ValueError("記録にはモデルが必要です")
+        self.model = model
+        self.path = path
+        self.mode = mode
+        self.hits = 0
+        self.recorded = 0
+        self.transcripts = load_transcripts(path)
+        # recordモードでも、同じ実行中に記録した応答は再利用する
+        self._recorded_keys = set()
+        self._lock = threading.Lock()
+
+    def invoke(self, messages, **params):
+        key = transcript_key(messages, params)
+
+        with self._lock:
+            entry = self.transcripts.get(key)
+        if self.mode != "record" or key in self._recorded_keys:
+            if entry is not None:
+                self.hits += 1
+                return AIMessage(
+                    content=entry['content'],
+                    response_metadata=entry.get('response_metadata', {}),
+                    usage_metadata=entry.get('usage_metadata'),
+                )
+            if self.mode == "replay":
+                raise MissingTranscriptError(key)
+
+        response = self.model.invoke(messages, **params)
+        with self._lock:
+            self.transcripts[key] = {
+                'messages': [[message.type, message.content] for message in messages],
+                'params': params,
+                'content': response.content,
+                'response_metadata': dict(getattr(response, 'response_metadata', None) or {}),
+                'usage_metadata': getattr(response, 'usage_metadata', None),
+            }
+            self._recorded_keys.add(key)
+            self.recorded += 1
+            save_transcripts(self.transcripts, self.path)
+        return response
@@ -0,0 +1,142 @@
+"""質問の複雑さと検索の確からしさに応じたモデル・max_tokens・temperatureの選択"""
+import time
+import threading
+from collections import deque
+
+# ルートごとのモデル設定（model.invokeにそのまま渡す）
+ROUTES = {
+    # よくある質問：短く確実に答えられるもの
+    'faq': {'model': 'gpt-4o-mini', 'max_tokens': 700, 'temperature': 0.5},
+    # 標準的な修理相談
+    'standard': {'model': 'gpt-4o-mini', 'max_tokens': 1000, 'temperature': 0.7},
+    # 原因の切り分けが必要な診断、または文書から根拠が見つからない質問
+    'diagnostic': {'model': 'gpt-4o', 'max_tokens': 1500, 'temperature': 0.4},
+}
+
+# 予算超過時の代替ルート
+FALLBACK_ROUTE = 'standard'
+
+# モデルごとの料金（USD / 100万トークン：入力, 出力）
+PRICES = {
+    'gpt-4o-mini': (0.15, 0.60),
+    'gpt-4o': (2.50, 10.00),
+}
+
+# 診断が必要な質問に含まれやすい語
+DIAGNOSTIC_MARKERS = [
+    '原因', 'なぜ', 'どうして', '診断', '症状', 'エラー', '点滅', '警告', '異音',
+    'ショート', '断線', '配線', '交換', '時々', 'たまに', 'しばらく', '焦げ', '煙',
+]
+
+# p95の計算に使う、ルートごとの直近のレイテンシの数
+LATENCY_SAMPLES = 1000
+
+# 回答が途中で切れた場合に続きを依頼するプロンプト
+CONTINUE_PROMPT = "回答が途中で切れました。直前の回答の続きから、重複せずに最後まで書いてください。"
+
+
+def estimate_complexity(question, categories=(), history_len=0):
+    """質問の複雑さを0〜1で推定"""
+    score = min(len(question) / 120, 1.0) * 0.4
+    score += 0.15 * sum(1 for marker in DIAGNOSTIC_MARKERS if marker in question)
+    # 複数の設備にまたがる質問
+    score += 0.1 * max(len(categories) - 1, 0)
+    # 会話の途中での追加質問
+    if history_len:
+        score += 0.1
+    return min(score, 1.0)
+
+
+def select_route(question, categories=(), retrieval_confidence=1.0, history_len=0):
+    """複雑さと検索の確からしさからルート名を選択"""
+    complexity = estimate_complexity(question, categories, history_len)
+    # 文書に根拠が見つからない場合は、ある程度複雑な質問から上位モデルを使う
+    if complexity >= 0.6 or (retrieval_confidence < 0.2 and complexity >= 0.3):
+        return 'diagnostic'
+    if complexity < 0.3 and retrieval_confidence >= 0.5:
+        return 'faq'
+    return 'standard'
+
+
+def is_truncated(response):
+    """max_tokensに達して回答が途中で切れたかどうか"""
+    metadata = getattr(response, 'response_metadata', None) or {}
+    return metadata.get('finish_reason') == 'length'
+
+
+class ModelRouter:
+    """ルートに応じてモデルを呼び出し、ルートごとのレイテンシ・コストを集計する"""
+
+    def __init__(self, model, routes=ROUTES, budget_usd=None):
+        self.model = model
+        self.routes = routes
+        self.budget_usd = budget_usd
+        self.stats = {name: {'calls': 0, 'latency': 0.0, 'input_tokens': 0, 'output_tokens': 0,
+                             'cost_usd': 0.0, 'truncated': 0} for name in routes}
+        self._latencies = {name: deque(maxlen=LATENCY_SAMPLES) for name in routes}
+        self._lock = threading.Lock()
+
+    def select(self, question, categories=(), retrieval_confidence=1.0, history_len=0):
+        """ルートを選択（予算を使い切った場合は安いルートに切り替え）"""
+        route = select_route(question, categories, retrieval_confidence, history_len)
+        if route not in self.routes:
+            route = FALLBACK_ROUTE
+        if self.over_budget() and route != 'faq':
+            route = FALLBACK_ROUTE
+        return route
+
+    def invoke(self, messages, route):
+        """ルートの設定でモデルを呼び出す"""
+        params = self.routes[route]
+        start = time.perf_counter()
+        response = self.model.invoke(messages, **params)
+        self._record(route, params['model'], response, time.perf_counter() - start)
+        return response
+
+    def _record(self, route, model_name, response, latency):
+        usage = getattr(response, 'usage_metadata', None) or {}
+        input_tokens = usage.get('input_tokens', 0)
+        output_tokens = usage.get('output_tokens', 0)
+        input_price, output_price = PRICES.get(model_name, (0.0, 0.0))
+        cost = (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+        with self._lock:
+            stats = self.stats[route]
+            stats['calls'] += 1
+            stats['latency'] += latency
+            stats['input_tokens'] += input_tokens
+            stats['output_tokens'] += output_tokens
+            stats['cost_usd'] += cost
+            stats['truncated'] += int(is_truncated(response))
+            self._latencies[route].append(latency)
+
+    def spent_usd(self):
+        with self._lock:
+            return sum(stats['cost_usd'] for stats in self.stats.values())
+
+    def over_budget(self):
+        return self.budget_usd is not None and self.spent_usd() >= self.budget_usd
+
+    def summary(self):
+        """ルートごとの呼び出し回数・平均/p95レイテンシ（秒）・トークン数・コスト"""
+        with self._lock:
+            return {
+                name: {
+                    **stats,
+                    'avg_latency': stats['latency'] / stats['calls'] if stats['calls'] else 0.0,
+                    'p95_latency': _p95(self._latencies[name]),
+                }
+                for name, stats in self.stats.items()
+            }
+
+
+def _p95(samples):
+    samples = sorted(samples)
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+
+def as_router(model):
+    """チャットモデルをそのまま渡された場合はルーターで包む"""
+    return model if isinstance(model, ModelRouter) else ModelRouter(model)
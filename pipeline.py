@@ -0,0 +1,360 @@
+"""キャンピングカー修理チャットの回答パイプライン（Streamlitに依存しない部分）"""
+import os
+import re
+
+from langchain_openai import ChatOpenAI
+
+from langchain_core.messages import HumanMessage, AIMessage
+
+from ingest import load_documents, knowledge_base_files
+from blog_urls import extract_title_from_url, categorize_blog_urls, url_index_for
+from model_router import ROUTES, FALLBACK_ROUTE, CONTINUE_PROMPT, as_router, is_truncated
+from tenant_config import DEFAULT_TENANT
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# === ブログURL抽出関数 ===
+def extract_blog_urls(documents, question="", tenant=DEFAULT_TENANT):
+    """文書からブログURLを抽出（質問に関連するURLを先頭に）"""
+    return url_index_for(documents, tenant.url_pattern).related_urls(question)
+
+def extract_scenario_related_blogs(documents, question="", categories=None, tenant=DEFAULT_TENANT):
+    """シナリオファイルから関連ブログを抽出（改善版）"""
+    related_blogs = []
+    
+    if not question:
+        return []
+    
+    # 実際のファイルから抽出したカテゴリごとのURL（取り込み時に作成済み）
+    actual_urls = url_index_for(documents, tenant.url_pattern).category_urls
+    
+    # 質問と各カテゴリの関連性を判定（スコアの高い順）
+    if categories is None:
+        categories = tenant.classify(question)
+    
+    matched_categories = []
+    for category_name, score in categories:
+        if category_name not in tenant.blog_cards:
+            continue
+        category_info = dict(tenant.blog_cards[category_name])
+        category_info['url'] = actual_urls.get(category_name, category_info['url'])
+        if not category_info['url']:
+            continue
+        matched_categories.append({
+            'name': category_name,
+            'info': category_info,
+            'score': score
+        })
+    
+    # 上位3件まで関連ブログを追加
+    for category in matched_categories[:3]:
+        blog_info = {
+            'title': category['info']['title'],
+            'url': category['info']['url'],
+            'category': category['info']['category'],
+            'relevance_score': category['score'],
+            'content_preview': f"{category['name']}に関する修理方法と対処法について詳しく解説しています。",
+            'source_file': 'シナリオファイル'
+        }
+        related_blogs.append(blog_info)
+    
+    # デフォルトブログを追加（関連ブログが少ない場合）
+    if len(related_blogs) < 2:
+        related_blogs.extend(tenant.default_blogs)
+    
+    return related_blogs[:3]  # 最大3件まで返す
+
+
+
+# === モデル ===
+def create_model(api_key):
+    """チャットモデルを作成（既定値は代替ルートの設定。呼び出しごとにModelRouterがルートの設定で上書きする）"""
+    return ChatOpenAI(api_key=api_key, **ROUTES[FALLBACK_ROUTE])
+
+# === RAGとプロンプトテンプレート ===
+# 多くの文書に含まれるため、カテゴリの文書が質問に合っているかの判断には使わない語
+GENERIC_TERMS = ('キャンピングカー', '修理', '方法', '対処', '故障', '原因', '交換', '点検', '症状', '手順')
+
+# カテゴリの文書を使うために必要な、質問固有の2文字の並びの一致割合（下回る場合は全文書から検索）
+MIN_CATEGORY_OVERLAP = 0.2
+
+def rag_retrieve(question: str, documents, categories=None, tenant=DEFAULT_TENANT):
+    """RAGで関連文書を取得"""
+    return retrieve(question, documents, categories, tenant)[0]
+
+def retrieve(question: str, documents, categories=None, tenant=DEFAULT_TENANT):
+    """関連文書の抜粋と検索の確からしさ（0〜1）を返す
+
+    カテゴリが推定できた場合は、そのカテゴリのファイルに絞って検索する。
+    """
+    if categories is None:
+        categories = tenant.classify(question)
+    
+    if categories:
+        names = {name for name, _ in categories}
+        category_docs = [doc for doc in documents if doc.metadata.get('category') in names]
+        if category_docs:
+            snippet, confidence = _keyword_retrieve(question, category_docs)
+            if snippet is not None:
+                return snippet, confidence
+            # 日本語の質問は空白で区切られずキーワードが一致しないため、文字の並びの重なりで選ぶ
+            # （質問固有の語がカテゴリの文書にほとんどない場合は、分類が外れたとみなして全文書から検索）
+            snippet, confidence, overlap = _overlap_retrieve(question, category_docs)
+            if overlap >= MIN_CATEGORY_OVERLAP:
+                return snippet, confidence
+    
+    snippet, confidence = _keyword_retrieve(question, documents)
+    if snippet is None:
+        return "キャンピングカーの修理に関する一般的な情報をお探しします。", 0.0
+    return snippet, confidence
+
+def _keyword_retrieve(question: str, documents):
+    """キーワードのスコアで上位の文書を結合し、(抜粋, 確からしさ)を返す（該当なしは抜粋がNone）"""
+    # キーワードベースの検索
+    relevant_docs = []
+    keywords = question.lower().split()
+    
+    # より詳細なキーワード抽出
+    important_keywords = []
+    for keyword in keywords:
+        if len(keyword) > 2:  # 2文字以上のキーワードのみ
+            important_keywords.append(keyword)
+    
+    for doc in documents:
+        doc_content = doc.page_content.lower()
+        score = 0
+        
+        # 完全一致の重みを高く
+        for keyword in important_keywords:
+            if keyword in doc_content:
+                score += 2
+            # 部分一致も考慮
+            if any(keyword in word for word in doc_content.split()):
+                score += 1
+        
+        if score > 0:
+            relevant_docs.append((doc, score))
+    
+    # スコアでソート
+    relevant_docs.sort(key=lambda x: x[1], reverse=True)
+    
+    if relevant_docs:
+        # 上位3件の文書を結合
+        top_docs = relevant_docs[:3]
+        return _combine_docs(top_docs), _overlap_confidence(question, [doc for doc, _ in top_docs])
+    return None, 0.0
+
+def _question_bigrams(question: str, specific=False):
+    """質問の内容語の2文字の並び（空白・記号と、ひらがなだけの並びは除く）
+
+    specificの場合は、ひらがなを含む並びとGENERIC_TERMSの語の一部も除く（質問固有の語のみ）。
+    """
+    text = question.lower()
+    bigrams = set()
+    for a, b in zip(text, text[1:]):
+        if not (a.isalnum() and b.isalnum()):
+            continue
+        a_hiragana = '\u3041' <= a <= '\u309f'
+        b_hiragana = '\u3041' <= b <= '\u309f'
+        if a_hiragana and b_hiragana:
+            continue
+        if specific and (a_hiragana or b_hiragana or any(a + b in term for term in GENERIC_TERMS)):
+            continue
+        bigrams.add(a + b)
+    return bigrams
+
+def _overlap_confidence(question: str, documents):
+    """検索の確からしさ（質問の2文字の並びのうち、最も多く含む文書に含まれる割合）
+
+    空白で区切られない日本語の質問でも、選んだ文書が質問の内容をどれだけ含むかを表す。
+    """
+    bigrams = _question_bigrams(question)
+    if not bigrams or not documents:
+        return 0.0
+    best = max(sum(1 for bigram in bigrams if bigram in doc.page_content.lower()) for doc in documents)
+    return best / len(bigrams)
+
+def _overlap_retrieve(question: str, documents):
+    """質問固有の2文字の並びを多く含む上位の文書を結合し、(抜粋, 確からしさ, 質問固有の並びの一致割合)を返す"""
+    bigrams = _question_bigrams(question, specific=True)
+    if not bigrams:
+        return None, 0.0, 0.0
+    scored = [(doc, sum(1 for bigram in bigrams if bigram in doc.page_content.lower())) for doc in documents]
+    # 同点の場合は文書の順序を保つ
+    scored.sort(key=lambda x: x[1], reverse=True)
+    top_docs = scored[:3]
+    overlap = top_docs[0][1] / len(bigrams)
+    return _combine_docs(top_docs), _overlap_confidence(question, [doc for doc, _ in top_docs]), overlap
+
+def _combine_docs(top_docs):
+    """(文書, スコア)のリストの本文を、文書あたり500文字・合計1500文字に制限して結合"""
+    combined_content = ""
+    for doc, score in top_docs:
+        content = doc.page_content
+        if len(content) > 500:  # 各文書を500文字に制限
+            content = content[:500] + "..."
+        combined_content += f"\n\n---\n{content}"
+    
+    if len(combined_content) > 1500:
+        combined_content = combined_content[:1500] + "..."
+    return combined_content
+
+template = """
+あなたはキャンピングカーの修理専門家で、親しみやすく思いやりのあるキャラクターです。以下の文書抜粋を参照して質問に答えてください。
+
+文書抜粋：{document_snippet}
+
+質問：{question}
+
+以下の形式で、温かみがあり親しみやすい口調で回答してください。修理に困っている方への思いやりと励ましの気持ちを込めて、分かりやすく説明してください。絶対にリンク、URL、検索結果、動画情報、商品情報、関連リンク、Google検索、YouTube動画、Amazon商品、🔗、🔍、📺、🛒、🏢、📖、📞、🔄、❓、💬、🔧、📋、🆕、🔋、🚰、🔥、🧊、🔧、🆕、【関連リンク】、【関連情報】、【詳細情報】、【参考リンク】、【外部リンク】、【検索結果】、【動画情報】、【商品情報】は含めないでください：
+
+【対処法】
+• 具体的な手順
+• 注意点
+• 必要な工具・部品
+
+答え：
+"""
+def build_prompt(question: str, document_snippet: str, tenant=DEFAULT_TENANT):
+    """RAGの抜粋を埋め込んだプロンプトを構築"""
+    # プロンプトを構築（外部リンクを完全に除外）
+    return template.format(document_snippet=document_snippet, question=question) + "\n\n重要：回答には絶対に外部リンク、URL、関連リンク、【関連リンク】、【関連情報】、【詳細情報】、【参考リンク】、【外部リンク】、【検索結果】、【動画情報】、【商品情報】、🔗、🔍、📺、🛒、🏢、📖、📞、🔄、❓、💬、🔧、📋、🆕、🔋、🚰、🔥、🧊、🔧、🆕、Google検索、YouTube動画、Amazon商品、• Google検索、• YouTube動画、• Amazon商品を含めないでください。純粋な修理アドバイスのみを提供してください。【対処法】セクションのみを含めてください。⚠️ 重要: 安全な修理作業のため、複雑な修理や専門的な作業が必要な場合は、" + tenant.support_center + "にご相談ください。"
+
+# === 回答のフィルタリング ===
+def sanitize_response(response_content: str):
+    """回答からリンクや関連情報セクションを除去"""
+    # すべてのURLを除去
+    clean_response = re.sub(r'https?://[^\s]+', '', response_content)
+    
+    # すべてのMarkdownリンクを除去
+    clean_response = re.sub(r'\[.*?\]\(.*?\)', '', clean_response)
+    
+    # 関連リンクセクション全体を除去
+    clean_response = re.sub(r'【関連リンク】.*?【', '【', clean_response, flags=re.DOTALL)
+    clean_response = re.sub(r'【関連情報】.*?【', '【', clean_response, flags=re.DOTALL)
+    clean_response = re.sub(r'【詳細情報】.*?【', '【', clean_response, flags=re.DOTALL)
+    clean_response = re.sub(r'【参考リンク】.*?【', '【', clean_response, flags=re.DOTALL)
+    clean_response = re.sub(r'【外部リンク】.*?【', '【', clean_response, flags=re.DOTALL)
+    clean_response = re.sub(r'【検索結果】.*?【', '【', clean_response, flags=re.DOTALL)
+    clean_response = re.sub(r'【動画情報】.*?【', '【', clean_response, flags=re.DOTALL)
+    clean_response = re.sub(r'【商品情報】.*?【', '【', clean_response, flags=re.DOTALL)
+    
+    # リンク関連のアイコンとテキストを除去
+    clean_response = re.sub(r'🔗.*?関連.*?🔗', '', clean_response, flags=re.DOTALL)
+    clean_response = re.sub(r'🔍.*?検索.*?🔍', '', clean_response, flags=re.DOTALL)
+    clean_response = re.sub(r'📺.*?動画.*?📺', '', clean_response, flags=re.DOTALL)
+    clean_response = re.sub(r'🛒.*?商品.*?🛒', '', clean_response, flags=re.DOTALL)
+    clean_response = re.sub(r'📖.*?情報.*?📖', '', clean_response, flags=re.DOTALL)
+    clean_response = re.sub(r'📞.*?サポート.*?📞', '', clean_response, flags=re.DOTALL)
+    
+    # 具体的なリンクパターンを除去
+    clean_response = re.sub(r'• Google検索:.*?$', '', clean_response, flags=re.MULTILINE)
+    clean_response = re.sub(r'• YouTube動画:.*?$', '', clean_response, flags=re.MULTILINE)
+    clean_response = re.sub(r'• Amazon商品:.*?$', '', clean_response, flags=re.MULTILINE)
+    
+    # リンク全体を除去
+    clean_response = re.sub(r'【関連リンク】.*?$', '', clean_response, flags=re.DOTALL)
+    clean_response = re.sub(r'【関連情報】.*?$', '', clean_response, flags=re.DOTALL)
+    clean_response = re.sub(r'【詳細情報】.*?$', '', clean_response, flags=re.DOTALL)
+    clean_response = re.sub(r'【参考リンク】.*?$', '', clean_response, flags=re.DOTALL)
+    clean_response = re.sub(r'【外部リンク】.*?$', '', clean_response, flags=re.DOTALL)
+    clean_response = re.sub(r'【検索結果】.*?$', '', clean_response, flags=re.DOTALL)
+    clean_response = re.sub(r'【動画情報】.*?$', '', clean_response, flags=re.DOTALL)
+    clean_response = re.sub(r'【商品情報】.*?$', '', clean_response, flags=re.DOTALL)
+    
+    # 空行を整理
+    clean_response = re.sub(r'\n\s*\n\s*\n', '\n\n', clean_response)
+    
+    # 最終的なフィルタリング - 関連リンクセクションが残っている場合は除去
+    if '【関連リンク】' in clean_response:
+        clean_response = clean_response.split('【関連リンク】')[0]
+    if '【関連情報】' in clean_response:
+        clean_response = clean_response.split('【関連情報】')[0]
+    if '【詳細情報】' in clean_response:
+        clean_response = clean_response.split('【詳細情報】')[0]
+    if '【参考リンク】' in clean_response:
+        clean_response = clean_response.split('【参考リンク】')[0]
+    if '【外部リンク】' in clean_response:
+        clean_response = clean_response.split('【外部リンク】')[0]
+    if '【検索結果】' in clean_response:
+        clean_response = clean_response.split('【検索結果】')[0]
+    if '【動画情報】' in clean_response:
+        clean_response = clean_response.split('【動画情報】')[0]
+    if '【商品情報】' in clean_response:
+        clean_response = clean_response.split('【商品情報】')[0]
+    
+    if '🔗 関連リンク' in clean_response:
+        clean_response = clean_response.split('🔗 関連リンク')[0]
+    
+    # 最後の改行を整理
+    return clean_response.strip()
+
+# === 回答生成 ===
+def prepare_question(question: str, documents, tenant=DEFAULT_TENANT):
+    """LLM呼び出し前の準備（カテゴリ分類・検索・プロンプト構築・関連ブログ）を行う"""
+    # 検索の絞り込みと関連ブログの選択に同じ分類結果を使う
+    categories = tenant.classify(question)
+    document_snippet, confidence = retrieve(question, documents, categories, tenant)
+    return {
+        'question': question,
+        'categories': categories,
+        'confidence': confidence,
+        'content': build_prompt(question, document_snippet, tenant),
+        'blogs': extract_scenario_related_blogs(documents, question, categories, tenant),
+    }
+
+def answer_question(question: str, documents, model, history=(), prepared=None, tenant=DEFAULT_TENANT):
+    """質問に対する回答を生成して、元の回答・フィルタ済み回答・関連ブログを返す
+
+    modelにModelRouterを渡すと、ルートごとのレイテンシ・コストが集計される。
+    preparedにprepare_questionの結果（先読み済み）を渡すと、検索を省略する。
+    tenantを渡すと、そのテナントのカテゴリ表・ブログカード・相談先を使う。
+    """
+    router = as_router(model)
+    
+    if prepared is None:
+        prepared = prepare_question(question, documents, tenant)
+    categories = prepared['categories']
+    content = prepared['content']
+    confidence = prepared['confidence']
+    
+    # 会話履歴の後ろに新しいメッセージを追加
+    messages = list(history) + [HumanMessage(content=content)]
+    
+    # 質問の複雑さと検索の確からしさからモデル・max_tokensを選択して回答を生成
+    route = router.select(question, categories, confidence, len(history))
+    response = router.invoke(messages, route)
+    response_content = response.content
+    
+    # デバッグ用：元の回答を確認
+    print("Original response:", response_content)
+    
+    clean_response = sanitize_response(response_content)
+    
+    # デバッグ用：フィルタリング後の回答を確認
+    print("Filtered response:", clean_response)
+    
+    return {
+        'raw': response_content,
+        'answer': clean_response,
+        'blogs': prepared['blogs'],
+        'route': route,
+        'truncated': is_truncated(response),
+        'messages': messages,
+    }
+
+def continue_answer(result, model):
+    """途中で切れた回答の続きを生成し、続きを含めた結果を返す"""
+    router = as_router(model)
+    
+    messages = result['messages'] + [AIMessage(content=result['raw']), HumanMessage(content=CONTINUE_PROMPT)]
+    response = router.invoke(messages, result['route'])
+    
+    raw = result['raw'] + response.content
+    return {
+        **result,
+        'raw': raw,
+        'answer': sanitize_response(raw),
+        'continuation': sanitize_response(response.content),
+        'truncated': is_truncated(response),
+    }
@@ -0,0 +1,243 @@
+"""質問の先読み（送信前に検索とプロンプト構築をバックグラウンドで実行）
+
+質問が分かった時点（クイック質問のクリック、入力途中の質問のAPI送信）で
+prepare_questionを実行して結果を保持し、送信後はすぐにLLMを呼び出せるようにします。
+
+使い方:
+    python prefetch.py bench          # 送信→プロンプト完成までの時間を計測
+    python prefetch.py bench --live   # 送信→最初のトークンまでの時間を計測（APIキーが必要）
+"""
+import json
+import time
+import argparse
+import threading
+import statistics
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from langchain_core.messages import HumanMessage
+
+from pipeline import prepare_question
+from tenant_config import DEFAULT_TENANT, DEFAULT_TENANT_ID
+
+# 入力が止まってから先読みを始めるまでの待ち時間（秒）
+DEBOUNCE_SECONDS = 0.3
+
+# 先読みを受け付ける質問の最大文字数
+MAX_QUESTION_LENGTH = 500
+
+# 先読みAPIが受け付けるリクエスト本文の最大バイト数（質問文はUTF-8で1文字最大4バイト）
+MAX_BODY_BYTES = MAX_QUESTION_LENGTH * 4 + 1024
+
+# 入力が止まるのを待っている入力元（セッション）の最大数
+MAX_PENDING = 256
+
+
+class Prefetcher:
+    """質問ごとのprepare_questionの結果をスレッドプールで先に計算して保持する"""
+
+    def __init__(self, documents, tenant=DEFAULT_TENANT, max_workers=2, max_entries=64):
+        self.documents = documents
+        self.tenant = tenant
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._futures = OrderedDict()
+        self._timers = {}
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def submit(self, question):
+        """先読みを開始（実行中・実行済みの場合はそのまま、終了後は何もしない）"""
+        question = question.strip()
+        if not question or len(question) > MAX_QUESTION_LENGTH:
+            return None
+        with self._lock:
+            # テナントの解放でclose済みの場合（getはその場で計算する）
+            if self._closed:
+                return None
+            future = self._futures.get(question)
+            if future is not None:
+                self._futures.move_to_end(question)
+                return future
+            future = self._executor.submit(prepare_question, question, self.documents, self.tenant)
+            self._futures[question] = future
+            # 古いものから破棄
+            while len(self._futures) > self.max_entries:
+                self._futures.popitem(last=False)
+            return future
+
+    def schedule(self, key, question, delay=DEBOUNCE_SECONDS):
+        """入力途中の質問を、入力が止まってから先読みする（keyはセッションなど入力元の識別子）
+
+        待機中の入力元がMAX_PENDINGに達している場合と、close済みの場合は受け付けずFalseを返す。
+        """
+        timer = threading.Timer(delay, lambda: self._fire(key, question, timer))
+        timer.daemon = True
+        with self._lock:
+            if self._closed:
+                return False
+            previous = self._timers.get(key)
+            if previous is not None:
+                previous.cancel()
+            elif len(self._timers) >= MAX_PENDING:
+                return False
+            self._timers[key] = timer
+        timer.start()
+        return True
+
+    def _fire(self, key, question, timer):
+        # 待機が終わった入力元は登録から外す（後から同じkeyで登録されたものは残す）
+        with self._lock:
+            if self._timers.get(key) is timer:
+                del self._timers[key]
+        self.submit(question)
+
+    def get(self, question):
+        """先読みの結果を返す（先読みしていない場合はその場で計算）"""
+        question = question.strip()
+        with self._lock:
+            future = self._futures.get(question)
+        if future is not None:
+            try:
+                result = future.result()
+                self.hits += 1
+                return result
+            except Exception:
+                pass
+        self.misses += 1
+        return prepare_question(question, self.documents, self.tenant)
+
+    def close(self):
+        """待機中の先読みを止めてスレッドプールを終了（以降のsubmit・scheduleは何もしない）"""
+        with self._lock:
+            self._closed = True
+            for timer in self._timers.values():
+                timer.cancel()
+            self._timers.clear()
+            self._futures.clear()
+        self._executor.shutdown(wait=False)
+
+
+def start_prefetch_server(prefetcher_for, port, host="127.0.0.1"):
+    """入力途中の質問を受け取るAPI（POST /prefetch {"tenant": ..., "session_id": ..., "question": ...}）を起動
+
+    prefetcher_forはテナントIDからPrefetcherを返す関数（受け付けない場合はNone）。
+    """
+
+    class PrefetchHandler(BaseHTTPRequestHandler):
+        def _send(self, status):
+            self.send_response(status)
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.send_header("Access-Control-Allow-Methods", "POST, OPTIONS")
+            self.send_header("Access-Control-Allow-Headers", "Content-Type")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def do_OPTIONS(self):
+            self._send(204)
+
+        def do_POST(self):
+            if self.path != "/prefetch":
+                self._send(404)
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+            except ValueError:
+                self._send(400)
+                return
+            if length < 0 or length > MAX_BODY_BYTES:
+                self._send(413)
+                self.close_connection = True
+                return
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+                question = str(body.get("question", ""))
+                key = str(body.get("session_id", self.client_address[0]))
+                tenant_id = str(body.get("tenant", DEFAULT_TENANT_ID))
+            except (ValueError, AttributeError):
+                self._send(400)
+                return
+            prefetcher = prefetcher_for(tenant_id)
+            if prefetcher is None:
+                self._send(404)
+                return
+            self._send(202 if prefetcher.schedule(key, question) else 429)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), PrefetchHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# === ベンチマーク ===
+def _percentiles(samples):
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    return statistics.median(samples) * 1000, p95 * 1000
+
+
+def _first_token_latency(router, prepared):
+    """プロンプト完成後、ストリーミングで最初のトークンが届くまでの時間"""
+    route = router.select(prepared['question'], prepared['categories'], prepared['confidence'])
+    start = time.perf_counter()
+    for _ in router.model.stream([HumanMessage(content=prepared['content'])], **router.routes[route]):
+        return time.perf_counter() - start
+    return time.perf_counter() - start
+
+
+def benchmark(documents, questions, router=None, think_time=0.5):
+    """先読みあり/なしで、送信からプロンプト完成（と最初のトークン）までの時間を表示"""
+    results = {}
+    for mode in ("no prefetch", "prefetch"):
+        prefetcher = Prefetcher(documents)
+        ready, first_token = [], []
+        for question in questions:
+            if mode == "prefetch":
+                # 入力中に先読みが始まり、ユーザーが送信するまでの時間を想定
+                prefetcher.submit(question)
+                time.sleep(think_time)
+            start = time.perf_counter()
+            prepared = prefetcher.get(question)
+            ready.append(time.perf_counter() - start)
+            if router is not None:
+                first_token.append(ready[-1] + _first_token_latency(router, prepared))
+        results[mode] = (ready, first_token)
+
+    for mode, (ready, first_token) in results.items():
+        median, p95 = _percentiles(ready)
+        line = f"{mode:12s}: submit→prompt median {median:.2f} ms / p95 {p95:.2f} ms"
+        if first_token:
+            median, p95 = _percentiles(first_token)
+            line += f" | submit→first token median {median:.0f} ms / p95 {p95:.0f} ms"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="質問の先読みのベンチマーク")
+    parser.add_argument("command", choices=["bench"])
+    parser.add_argument("--live", action="store_true", help="LLMを呼び出して最初のトークンまでの時間も計測")
+    parser.add_argument("--think-time", type=float, default=0.5, help="先読み開始から送信までの秒数")
+    args = parser.parse_args()
+
+    from pipeline import load_documents
+    from quick_answers import QUICK_QUESTIONS
+    from category_classifier import EVAL_QUESTIONS
+
+    router = None
+    if args.live:
+        import config
+        from model_router import ModelRouter
+        from pipeline import create_model
+        router = ModelRouter(create_model(config.OPENAI_API_KEY))
+
+    questions = [prompt for _, prompt in QUICK_QUESTIONS] + [q for q, _ in EVAL_QUESTIONS]
+    benchmark(load_documents(), questions, router, args.think_time)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""クイック質問・よくある質問の回答を事前生成するバッチ処理
+
+使い方:
+    python quick_answers.py            # 知識ベース・質問リスト・プロンプトが変わっている場合のみ再生成
+    python quick_answers.py --force    # 強制的に再生成
+    python quick_answers.py --tenant partner-a   # テナントを指定
+"""
+import os
+import json
+import hashlib
+import argparse
+import functools
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from model_router import ROUTES, CONTINUE_PROMPT, ModelRouter
+from pipeline import (APP_DIR, knowledge_base_files, load_documents, create_model, build_prompt,
+                      answer_question, continue_answer)
+from tenant_config import DEFAULT_TENANT, DEFAULT_TENANT_ID, load_tenant_configs
+
+# クイック質問ボタン（ラベル, 質問文）
+QUICK_QUESTIONS = [
+    ("🔋 バッテリー上がり", "バッテリーが上がってエンジンが始動しない時の対処法を教えてください"),
+    ("🚰 水道ポンプ", "水道ポンプから水が出ない時の修理方法は？"),
+    ("🔥 ガスコンロ", "ガスコンロが点火しない時の対処法を教えてください"),
+    ("🧊 冷蔵庫", "冷蔵庫が冷えない時の修理方法は？"),
+    ("🔧 定期点検", "キャンピングカーの定期点検項目とスケジュールは？"),
+]
+
+# 事前生成した回答の保存先（*.txtは知識ベースとして読み込まれるためJSONで保存）
+STORE_PATH = os.path.join(APP_DIR, "quick_answers.json")
+
+# よくある質問のリスト（質問文のJSON配列）
+FAQ_PATH = os.path.join(APP_DIR, "faq_questions.json")
+
+# 同時に実行するLLM呼び出しの上限
+DEFAULT_WORKERS = 4
+
+# 回答が途中で切れた場合に続きを生成する回数の上限
+MAX_CONTINUATIONS = 2
+
+# 生成に失敗した質問を再試行する回数
+MAX_RETRIES = 1
+
+
+def corpus_version(main_path=APP_DIR):
+    """知識ベースのファイル名と内容からバージョン（ハッシュ）を計算"""
+    digest = hashlib.sha256()
+    for path in knowledge_base_files(main_path):
+        digest.update(os.path.basename(path).encode('utf-8'))
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def answers_version(main_path=APP_DIR, faq_path=FAQ_PATH, tenant=DEFAULT_TENANT):
+    """事前生成回答のバージョン（知識ベース・質問リスト・プロンプト・ルート設定のハッシュ）"""
+    settings = {
+        'corpus': corpus_version(main_path),
+        'questions': precompute_questions(faq_path),
+        'prompt': build_prompt("{question}", "{document_snippet}", tenant),
+        'routes': ROUTES,
+        'continue_prompt': CONTINUE_PROMPT,
+    }
+    data = json.dumps(settings, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def load_faq_questions(path=FAQ_PATH):
+    """よくある質問のリストを読み込む（ファイルがなければ空）"""
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [q for q in json.load(f) if q]
+
+
+def precompute_questions(faq_path=FAQ_PATH):
+    """事前生成の対象となる質問（重複なし、順序を保持）"""
+    questions = [prompt for _, prompt in QUICK_QUESTIONS] + load_faq_questions(faq_path)
+    return list(dict.fromkeys(questions))
+
+
+def complete_answer(question, documents, model, tenant=DEFAULT_TENANT):
+    """回答を生成し、途中で切れていれば続きを生成して完成させる"""
+    result = answer_question(question, documents, model, tenant=tenant)
+    for _ in range(MAX_CONTINUATIONS):
+        if not result['truncated']:
+            break
+        result = continue_answer(result, model)
+    return result
+
+
+def generate_answers(questions, documents, model, max_workers=DEFAULT_WORKERS, tenant=DEFAULT_TENANT):
+    """質問を並列数を制限してパイプラインに流し、質問→回答の辞書を返す（失敗した質問は含まない）"""
+    answers = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {q: executor.submit(complete_answer, q, documents, model, tenant) for q in questions}
+        for question, future in futures.items():
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"事前生成に失敗しました: {question} ({e})")
+                continue
+            answers[question] = {'answer': result['answer'], 'raw': result['raw'], 'blogs': result['blogs']}
+    return answers
+
+
+def save_store(answers, version, path=STORE_PATH):
+    """回答をバージョン情報付きで保存（versionがNoneの場合は古い回答として扱われる）"""
+    store = {
+        'version': version,
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'answers': answers,
+    }
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(store, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+@functools.lru_cache(maxsize=4)
+def _read_store(path, mtime):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def read_store(path=STORE_PATH):
+    """保存済みの回答を読み込む（ファイルが更新されるまではキャッシュを使用）"""
+    if not os.path.exists(path):
+        return None
+    try:
+        return _read_store(path, os.path.getmtime(path))
+    except (OSError, ValueError):
+        return None
+
+
+def is_stale(version, path=STORE_PATH):
+    """保存済みの回答が現在のバージョンと一致しないかどうか"""
+    store = read_store(path)
+    return store is None or store.get('version') != version
+
+
+def load_quick_answers(version, path=STORE_PATH):
+    """現在のバージョンに対応する回答のみを返す（古い場合は空）"""
+    if is_stale(version, path):
+        return {}
+    return read_store(path)['answers']
+
+
+def refresh_quick_answers(documents, model, version, path=STORE_PATH, faq_path=FAQ_PATH,
+                          max_workers=DEFAULT_WORKERS, force=False, tenant=DEFAULT_TENANT):
+    """バージョンが変わっていれば回答を再生成する。すべての質問の回答を保存できた場合はTrueを返す
+
+    失敗した質問が残った場合は、バージョンを付けずに保存して次回の起動時に再生成する。
+    """
+    if not force and not is_stale(version, path):
+        return False
+    questions = precompute_questions(faq_path)
+    answers = generate_answers(questions, documents, model, max_workers, tenant)
+    for _ in range(MAX_RETRIES):
+        failed = [q for q in questions if q not in answers]
+        if not failed:
+            break
+        answers.update(generate_answers(failed, documents, model, max_workers, tenant))
+
+    complete = len(answers) == len(questions)
+    save_store(answers, version if complete else None, path)
+    return complete
+
+
+def main():
+    parser = argparse.ArgumentParser(description="クイック質問の回答を事前生成します")
+    parser.add_argument("--tenant", default=DEFAULT_TENANT_ID, help="テナントID（tenants.json）")
+    parser.add_argument("--faq", help="よくある質問のJSONファイル（省略時はテナントの知識ベース内）")
+    parser.add_argument("--output", help="回答の保存先（省略時はテナントの知識ベース内）")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="同時実行数")
+    parser.add_argument("--force", action="store_true", help="知識ベースが同じでも再生成する")
+    args = parser.parse_args()
+
+    import config
+    if not config.OPENAI_API_KEY:
+        raise SystemExit("⚠️ OpenAI APIキーが設定されていません。")
+
+    tenant = load_tenant_configs()[args.tenant]
+    output = args.output or tenant.quick_answers_path
+    faq_path = args.faq or tenant.faq_path
+    version = answers_version(tenant.kb_path, faq_path, tenant)
+    if not args.force and not is_stale(version, output):
+        print(f"回答は最新です（version={version[:12]}）")
+        return
+
+    documents = load_documents(tenant.kb_path, tenant=tenant)
+    model = ModelRouter(create_model(config.OPENAI_API_KEY))
+    complete = refresh_quick_answers(documents, model, version, path=output, faq_path=faq_path,
+                                     max_workers=args.workers, force=True, tenant=tenant)
+    if complete:
+        print(f"{output} を更新しました（version={version[:12]}）")
+    else:
+        print(f"⚠️ 生成に失敗した質問があるため、{output} は次回に再生成されます")
+    for route, stats in model.summary().items():
+        if stats['calls']:
+            print(f"  {route}: {stats['calls']}回, 平均{stats['avg_latency']:.2f}秒 / p95 {stats['p95_latency']:.2f}秒, "
+                  f"{stats['input_tokens']}+{stats['output_tokens']} tokens, ${stats['cost_usd']:.4f}")
+
+
+if __name__ == "__main__":
+    main()
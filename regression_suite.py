@@ -0,0 +1,260 @@
+"""回答品質とレイテンシの回帰テスト
+
+固定の質問セットをパイプライン全体（分類 → 検索 → プロンプト構築 → 関連ブログ → LLM → フィルタ）に
+通し、記録済みのLLM応答（llm_transcripts.py）を再生してAPIキーなしで次を確認します。
+
+    - 検索結果（カテゴリ・抜粋・ルート）とフィルタ後の回答が基準と同じか
+    - 関連ブログカードの選択が基準と同じか
+    - 段階ごとのレイテンシのp95が基準から許容範囲を超えて遅くなっていないか
+
+使い方:
+    python regression_suite.py record            # LLMの応答を記録して基準を作成（APIキーが必要）
+    python regression_suite.py check             # 記録を再生して基準と比較（失敗時は終了コード1）
+    python regression_suite.py update            # 意図した変更の後、記録を再生して基準を更新
+    python regression_suite.py check --tenant <テナントID>   # テナントごとの記録と基準（regression/<テナントID>/）
+
+検索やプロンプトを変えてプロンプトが変わった質問は記録がないため失敗します。
+意図した変更であれば record で不足分のみ記録し直してください。
+"""
+import os
+import io
+import sys
+import json
+import time
+import hashlib
+import argparse
+import contextlib
+from datetime import datetime
+
+from llm_transcripts import TranscriptModel, MissingTranscriptError
+from model_router import ModelRouter
+from pipeline import (APP_DIR, load_documents, create_model, retrieve, build_prompt,
+                      extract_scenario_related_blogs, sanitize_response, prepare_question, answer_question)
+from quick_answers import QUICK_QUESTIONS, corpus_version
+from category_classifier import EVAL_QUESTIONS
+from tenant_config import DEFAULT_TENANT_ID, load_tenant_configs
+
+# 記録と基準の保存先（既定のテナント以外は regression/<テナントID>/）
+REGRESSION_DIR = os.path.join(APP_DIR, "regression")
+TRANSCRIPTS_PATH = os.path.join(REGRESSION_DIR, "transcripts.json")
+BASELINE_PATH = os.path.join(REGRESSION_DIR, "baseline.json")
+
+# 質問セット（質問文のJSON配列、なければクイック質問と分類の評価用質問）
+QUESTIONS_PATH = os.path.join(REGRESSION_DIR, "questions.json")
+
+# レイテンシを計測する段階
+STAGES = ("classify", "retrieve", "prompt", "blogs", "prepare", "answer", "sanitize")
+
+# p95の許容範囲（基準からの増加率と、計測誤差を吸収する最小の余裕）
+DEFAULT_TOLERANCE = 0.25
+DEFAULT_SLACK_MS = 0.5
+
+# p95を計算するための1質問あたりの繰り返し回数
+DEFAULT_REPEAT = 5
+
+
+def regression_dir(tenant_id=DEFAULT_TENANT_ID):
+    """テナントの記録と基準を保存するディレクトリ"""
+    if tenant_id == DEFAULT_TENANT_ID:
+        return REGRESSION_DIR
+    return os.path.join(REGRESSION_DIR, tenant_id)
+
+
+def fixture_questions(path=QUESTIONS_PATH):
+    """回帰テストの質問セット（重複なし、順序を保持）"""
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            questions = json.load(f)
+    else:
+        questions = [prompt for _, prompt in QUICK_QUESTIONS] + [q for q, _ in EVAL_QUESTIONS]
+    return list(dict.fromkeys(q for q in questions if q))
+
+
+def _digest(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+
+def _timed(timings, stage, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    timings.setdefault(stage, []).append((time.perf_counter() - start) * 1000)
+    return result
+
+
+def run_question(question, documents, router, tenant, timings):
+    """1つの質問をパイプラインに通し、基準と比較する内容（スナップショット）を返す"""
+    # 段階ごとの時間（prepare_questionの内訳）
+    categories = _timed(timings, "classify", tenant.classify, question)
+    snippet, confidence = _timed(timings, "retrieve", retrieve, question, documents, categories, tenant)
+    _timed(timings, "prompt", build_prompt, question, snippet, tenant)
+    _timed(timings, "blogs", extract_scenario_related_blogs, documents, question, categories, tenant)
+
+    # パイプライン全体（アプリと同じ呼び出し）
+    prepared = _timed(timings, "prepare", prepare_question, question, documents, tenant)
+    # answer_questionのデバッグ出力は表示しない
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = _timed(timings, "answer", answer_question, question, documents, router, (), prepared, tenant)
+    _timed(timings, "sanitize", sanitize_response, result['raw'])
+
+    return {
+        'categories': [name for name, _ in prepared['categories']],
+        'confidence': round(prepared['confidence'], 4),
+        'snippet': _digest(snippet),
+        'prompt': _digest(prepared['content']),
+        'route': result['route'],
+        'truncated': result['truncated'],
+        'answer': result['answer'],
+        'blogs': [[blog['category'], blog['url']] for blog in result['blogs']],
+    }
+
+
+def p95(samples):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+
+def run_suite(questions, documents, router, tenant, repeat=DEFAULT_REPEAT):
+    """質問セットを実行し、(質問→スナップショットまたはエラー, 段階→p95ミリ秒) を返す"""
+    snapshots = {}
+    timings = {}
+    for question in questions:
+        for _ in range(repeat):
+            try:
+                snapshots[question] = run_question(question, documents, router, tenant, timings)
+            except MissingTranscriptError:
+                snapshots[question] = {'error': "LLMの記録がありません（プロンプトが記録時から変わっています）"}
+                break
+    return snapshots, {stage: p95(timings[stage]) for stage in STAGES if stage in timings}
+
+
+def compare_snapshots(baseline, snapshots):
+    """基準と異なる質問ごとの差分メッセージのリスト"""
+    failures = []
+    for question, expected in baseline.items():
+        actual = snapshots.get(question)
+        if actual is None:
+            failures.append(f"{question}: 実行されていません")
+            continue
+        if 'error' in actual:
+            failures.append(f"{question}: {actual['error']}")
+            continue
+        for field, value in expected.items():
+            if actual.get(field) != value:
+                if field == 'answer':
+                    failures.append(f"{question}: フィルタ後の回答が変わりました")
+                else:
+                    failures.append(f"{question}: {field} {value} → {actual.get(field)}")
+    return failures
+
+
+def compare_latency(baseline_p95, current_p95, tolerance=DEFAULT_TOLERANCE, slack_ms=DEFAULT_SLACK_MS):
+    """p95が許容範囲を超えて遅くなった段階のメッセージのリスト"""
+    failures = []
+    for stage, expected in baseline_p95.items():
+        actual = current_p95.get(stage)
+        if actual is None:
+            continue
+        budget = expected * (1 + tolerance) + slack_ms
+        if actual > budget:
+            failures.append(f"{stage}: p95 {actual:.2f} ms > 許容 {budget:.2f} ms（基準 {expected:.2f} ms）")
+    return failures
+
+
+def save_baseline(snapshots, latency_p95, version, tenant_id, path=BASELINE_PATH):
+    """基準を保存（記録のない質問は含めない）"""
+    baseline = {
+        'tenant': tenant_id,
+        'corpus_version': version,
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'latency_p95_ms': latency_p95,
+        'snapshots': {q: s for q, s in snapshots.items() if 'error' not in s},
+    }
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def print_latency(latency_p95, baseline_p95=None):
+    for stage, value in latency_p95.items():
+        line = f"  {stage:9s}: p95 {value:.2f} ms"
+        if baseline_p95 and stage in baseline_p95:
+            line += f"（基準 {baseline_p95[stage]:.2f} ms）"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回答品質とレイテンシの回帰テスト")
+    parser.add_argument("command", choices=["record", "check", "update"])
+    parser.add_argument("--tenant", default=DEFAULT_TENANT_ID, help="テナントID（tenants.json）")
+    parser.add_argument("--questions", default=None, help="質問セットのJSONファイル（未指定ならテナントのディレクトリ）")
+    parser.add_argument("--transcripts", default=None, help="LLMの記録ファイル（未指定ならテナントのディレクトリ）")
+    parser.add_argument("--baseline", default=None, help="基準ファイル（未指定ならテナントのディレクトリ）")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="1質問あたりの繰り返し回数")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="p95の許容増加率")
+    parser.add_argument("--slack-ms", type=float, default=DEFAULT_SLACK_MS, help="p95の許容範囲に加える余裕（ミリ秒）")
+    parser.add_argument("--force", action="store_true", help="record時に記録済みの質問もLLMを呼び出し直す")
+    args = parser.parse_args()
+
+    tenant = load_tenant_configs()[args.tenant]
+    directory = regression_dir(tenant.tenant_id)
+    args.questions = args.questions or os.path.join(directory, os.path.basename(QUESTIONS_PATH))
+    args.transcripts = args.transcripts or os.path.join(directory, os.path.basename(TRANSCRIPTS_PATH))
+    args.baseline = args.baseline or os.path.join(directory, os.path.basename(BASELINE_PATH))
+    os.makedirs(os.path.dirname(os.path.abspath(args.transcripts)), exist_ok=True)
+
+    documents = load_documents(tenant.kb_path, tenant=tenant)
+    version = corpus_version(tenant.kb_path)
+    questions = fixture_questions(args.questions)
+
+    recorded = 0
+    if args.command == "record":
+        import config
+        if not config.OPENAI_API_KEY:
+            raise SystemExit("⚠️ OpenAI APIキーが設定されていません。")
+        model = TranscriptModel(create_model(config.OPENAI_API_KEY), args.transcripts,
+                                mode="record" if args.force else "auto")
+        # LLMの呼び出し時間を基準に含めないよう、記録だけを先に行う
+        run_suite(questions, documents, ModelRouter(model), tenant, repeat=1)
+        recorded = model.recorded
+
+    model = TranscriptModel(None, args.transcripts, mode="replay")
+    snapshots, latency_p95 = run_suite(questions, documents, ModelRouter(model), tenant, args.repeat)
+
+    if args.command in ("record", "update"):
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        save_baseline(snapshots, latency_p95, version, tenant.tenant_id, args.baseline)
+        missing = [q for q, s in snapshots.items() if 'error' in s]
+        print(f"{args.baseline} を更新しました（{len(questions) - len(missing)}問、新規記録 {recorded}件）")
+        for question in missing:
+            print(f"  記録なし: {question}")
+        print_latency(latency_p95)
+        return
+
+    if not os.path.exists(args.baseline):
+        raise SystemExit(f"基準がありません（{args.baseline}）。"
+                         f"先に python regression_suite.py record --tenant {tenant.tenant_id} を実行してください。")
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    # 他のテナントの基準とは比較しない
+    if baseline.get('tenant', DEFAULT_TENANT_ID) != tenant.tenant_id:
+        raise SystemExit(f"{args.baseline} はテナント {baseline.get('tenant', DEFAULT_TENANT_ID)} の基準です"
+                         f"（--tenant {tenant.tenant_id}）。--baseline でこのテナントの基準を指定してください。")
+    if baseline.get('corpus_version') != version:
+        print("⚠️ 知識ベースが基準の作成時から変わっています")
+
+    failures = compare_snapshots(baseline['snapshots'], snapshots)
+    failures += compare_latency(baseline['latency_p95_ms'], latency_p95, args.tolerance, args.slack_ms)
+
+    print(f"{len(baseline['snapshots'])}問（繰り返し{args.repeat}回）")
+    print_latency(latency_p95, baseline['latency_p95_ms'])
+    if failures:
+        print(f"❌ {len(failures)}件の回帰")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("✅ 回帰なし")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""テナント（修理工場）ごとの設定
+
+知識ベースの場所、ブログURL、関連ブログカード、カテゴリのキーワード、お問い合わせ案内を
+テナントごとに設定できます。設定ファイル（tenants.json）に書かれていない項目は
+岡山キャンピングカー修理サポートセンターの設定を使います。ただし、相談先・お問い合わせ案内・
+アイコン・ブログカードのURLなど他の事業者の情報になるものは、既定のテナント以外には引き継がず、
+事業者を特定しない内容（アイコンは標準のもの）になります。
+知識ベース（kb_path）の既定は tenants/<テナントID> です。事前生成回答と学習済み分類器は
+知識ベースのディレクトリに quick_answers_<テナントID>.json・category_model_<テナントID>.npz として
+保存するため、同じ知識ベースを指定したテナント同士でも上書きし合いません。
+
+tenants.json の例:
+    {
+        "partner-a": {
+            "name": "パートナーA修理工場",
+            "kb_path": "tenants/partner-a",
+            "blog_url_prefix": "https://partner-a.example.com/",
+            "support_center": "パートナーA修理工場",
+            "contact_info": "\n\n---\n\n**📞 お問い合わせ**\nお電話（000-000-0000）で受付けております。"
+        }
+    }
+"""
+import os
+import re
+import json
+import functools
+
+from category_classifier import CATEGORY_KEYWORDS, FILENAME_ORDER, MODEL_PATH, KeywordAutomaton, classify, get_automaton
+from blog_urls import URL_PATTERN
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# テナント設定ファイル
+TENANTS_PATH = os.path.join(APP_DIR, "tenants.json")
+
+# 既定のテナント以外の知識ベースを置くディレクトリ（kb_pathの指定がない場合）
+TENANTS_DIR = "tenants"
+
+DEFAULT_TENANT_ID = "default"
+
+# 複雑な修理の相談先として回答に含める名前
+SUPPORT_CENTER = "岡山キャンピングカー修理サポートセンター"
+
+# 回答者のアイコン
+AVATAR_URL = "https://camper-repair.net/blog/wp-content/uploads/2025/05/dummy_staff_01-150x138-1.png"
+
+# 関連ブログカードの表示内容（urlは実際のファイルにURLがない場合のデフォルト）
+BLOG_CARDS = {
+    '冷蔵庫': {
+        'url': 'https://camper-repair.net/refrigerator/',
+        'title': '冷蔵庫トラブル知識ベース（キャンピングカー用・コンプレッサ式／3WAY共通）',
+        'category': '🧊 冷蔵庫'
+    },
+    'ffヒーター': {
+        'url': 'https://camper-repair.net/ff-heater/',
+        'title': 'FFヒーターの故障と修理方法',
+        'category': '🔥 FFヒーター'
+    },
+    '雨漏り': {
+        'url': 'https://camper-repair.net/rain-leak/',
+        'title': '雨漏りの対処法と修理',
+        'category': '🌧️ 雨漏り'
+    },
+    'バッテリー': {
+        'url': 'https://camper-repair.net/battery/',
+        'title': 'バッテリーの故障と修理方法',
+        'category': '🔋 バッテリー'
+    },
+    '水道ポンプ': {
+        'url': 'https://camper-repair.net/water1/',
+        'title': '水道ポンプの故障と修理方法',
+        'category': '💧 水道ポンプ'
+    },
+    'ガスコンロ': {
+        'url': 'https://camper-repair.net/gas-stove/',
+        'title': 'ガスコンロの故障と修理方法',
+        'category': '🔥 ガスコンロ'
+    },
+    'トイレ': {
+        'url': 'https://camper-repair.net/toilet/',
+        'title': 'トイレの故障と修理方法',
+        'category': '🚽 トイレ'
+    },
+    'ソーラーパネル': {
+        'url': 'https://camper-repair.net/solar-panel/',
+        'title': 'ソーラーパネルの故障と修理方法',
+        'category': '☀️ ソーラーパネル'
+    },
+    'インバーター': {
+        'url': 'https://camper-repair.net/blog/inverter1/',
+        'title': 'インバーター選定と設置方法',
+        'category': '⚡ インバーター'
+    },
+    '電装系': {
+        'url': 'https://camper-repair.net/blog/electrical-solar-panel/',
+        'title': 'キャンピングカー配線の基本と電装システム',
+        'category': '🔌 電装系'
+    },
+    'ルーフベント': {
+        'url': 'https://camper-repair.net/roof-vent/',
+        'title': 'ルーフベント・換気扇の故障と修理方法',
+        'category': '💨 ルーフベント'
+    },
+    '家具': {
+        'url': 'https://camper-repair.net/furniture/',
+        'title': '家具の故障と修理方法',
+        'category': '🪑 家具'
+    },
+    '外部電源': {
+        'url': 'https://camper-repair.net/external-power/',
+        'title': '外部電源の故障と修理方法',
+        'category': '🔌 外部電源'
+    },
+    '排水タンク': {
+        'url': 'https://camper-repair.net/drain-tank/',
+        'title': '排水タンクの故障と修理方法',
+        'category': '🚰 排水タンク'
+    },
+    'ウインドウ': {
+        'url': 'https://camper-repair.net/window/',
+        'title': 'ウインドウの故障と修理方法',
+        'category': '🪟 ウインドウ'
+    },
+    '車体外装': {
+        'url': 'https://camper-repair.net/exterior/',
+        'title': '車体外装の故障と修理方法',
+        'category': '🚗 車体外装'
+    },
+    '異音': {
+        'url': 'https://camper-repair.net/noise/',
+        'title': '異音の原因と対処法',
+        'category': '🔊 異音'
+    }
+}
+
+# 関連ブログが少ない場合に追加するブログ
+DEFAULT_BLOGS = [
+    {
+        'title': 'キャンピングカー修理の基本',
+        'url': 'https://camper-repair.net/blog/repair1/',
+        'category': '🔧 基本修理',
+        'relevance_score': 5,
+        'content_preview': 'キャンピングカーの基本的な修理方法とメンテナンスについて詳しく解説しています。',
+        'source_file': '基本情報'
+    },
+    {
+        'title': '定期点検とメンテナンス',
+        'url': 'https://camper-repair.net/blog/risk1/',
+        'category': '📋 定期点検',
+        'relevance_score': 4,
+        'content_preview': 'キャンピングカーの定期点検項目とメンテナンススケジュールについて説明しています。',
+        'source_file': 'メンテナンス情報'
+    }
+]
+
+# 既定のテナント以外で相談先が設定されていない場合の表記
+NEUTRAL_SUPPORT_CENTER = "お近くの専門の修理業者"
+
+# 既定のテナント以外でお問い合わせ案内が設定されていない場合の案内
+NEUTRAL_CONTACT_INFO = "\n\n---\n\n**💬 追加の質問**\n他に何かご質問ありましたら、引き続きチャットボットに聞いてみてください。"
+
+# お問い合わせ案内
+CONTACT_INFO = "\n\n---\n\n**💬 追加の質問**\n他に何かご質問ありましたら、引き続きチャットボットに聞いてみてください。\n\n**📞 お問い合わせ**\n直接スタッフにお尋ねをご希望の方は、[お問い合わせフォーム](https://camper-repair.net/contact/)またはお電話（086-206-6622）で受付けております。\n\n【営業時間】年中無休（9:00～21:00）\n※不在時は折り返しお電話差し上げます。\n\n**🔗 関連ブログ**\nより詳しい情報は[修理ブログ一覧](https://camper-repair.net/repair/)をご覧ください。"
+
+
+def url_pattern_for(prefix):
+    """ブログURLの先頭部分から、本文中のURLを抽出する正規表現を作成"""
+    return re.compile(re.escape(prefix) + r'[^\s,、，。]+')
+
+
+class TenantConfig:
+    """1テナント分の設定（指定のない項目は既定値）"""
+
+    def __init__(self, tenant_id=DEFAULT_TENANT_ID, settings=None):
+        settings = settings or {}
+        self.tenant_id = tenant_id
+        # 既定のテナント以外の知識ベースは、指定がなければ tenants/<テナントID>
+        default_kb_path = '.' if tenant_id == DEFAULT_TENANT_ID else os.path.join(TENANTS_DIR, tenant_id)
+        self.kb_path = os.path.normpath(os.path.join(APP_DIR, settings.get('kb_path', default_kb_path)))
+        self.url_pattern = url_pattern_for(settings['blog_url_prefix']) if 'blog_url_prefix' in settings else URL_PATTERN
+
+        if tenant_id == DEFAULT_TENANT_ID:
+            self.name = settings.get('name', SUPPORT_CENTER)
+            self.support_center = settings.get('support_center', SUPPORT_CENTER)
+            self.contact_info = settings.get('contact_info', CONTACT_INFO)
+            self.avatar = settings.get('avatar', AVATAR_URL)
+        else:
+            # 他の事業者の連絡先・アイコンを表示しないよう、設定がなければ事業者を特定しない内容にする
+            self.name = settings.get('name', tenant_id)
+            self.support_center = settings.get('support_center', settings.get('name', NEUTRAL_SUPPORT_CENTER))
+            self.contact_info = settings.get('contact_info', NEUTRAL_CONTACT_INFO)
+            self.avatar = settings.get('avatar')
+
+        self.categories = settings.get('categories', CATEGORY_KEYWORDS)
+        self.category_names = list(self.categories) if 'categories' in settings else FILENAME_ORDER
+
+        if tenant_id == DEFAULT_TENANT_ID:
+            self.blog_cards = settings.get('blog_cards', BLOG_CARDS)
+            self.default_blogs = settings.get('default_blogs', DEFAULT_BLOGS)
+        else:
+            # 他のテナントの既定のブログカードは、知識ベースにURLが見つかったカテゴリのみ表示
+            self.blog_cards = settings.get('blog_cards') or {
+                name: {**card, 'url': None} for name, card in BLOG_CARDS.items()
+            }
+            self.default_blogs = settings.get('default_blogs', [])
+
+        # 学習済み線形分類器と事前生成回答はテナントごと（知識ベースを共有していても上書きしない）
+        if tenant_id == DEFAULT_TENANT_ID:
+            self.category_model_path = MODEL_PATH
+            self.quick_answers_path = os.path.join(self.kb_path, "quick_answers.json")
+        else:
+            self.category_model_path = os.path.join(self.kb_path, f"category_model_{tenant_id}.npz")
+            self.quick_answers_path = os.path.join(self.kb_path, f"quick_answers_{tenant_id}.json")
+        self.faq_path = os.path.join(self.kb_path, "faq_questions.json")
+
+    def classify(self, question, top_k=3):
+        """このテナントのカテゴリ表で質問のカテゴリを推定"""
+        return classify(question, top_k, self.category_model_path, self.automaton)
+
+    @functools.cached_property
+    def automaton(self):
+        """カテゴリのキーワードオートマトン"""
+        if self.categories is CATEGORY_KEYWORDS:
+            return get_automaton()
+        return KeywordAutomaton(self.categories)
+
+
+DEFAULT_TENANT = TenantConfig()
+
+
+def load_tenant_configs(path=TENANTS_PATH):
+    """設定ファイルからテナント設定を読み込む（既定のテナントは常に含む）"""
+    configs = {DEFAULT_TENANT_ID: DEFAULT_TENANT}
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            for tenant_id, settings in json.load(f).items():
+                configs[tenant_id] = TenantConfig(tenant_id, settings)
+    return configs
@@ -0,0 +1,161 @@
+"""テナントごとの知識ベース・回答キャッシュの管理
+
+知識ベースは初めて使われたときに読み込み、読み込み済みのテナント数または
+メモリ使用量の上限を超えた場合は、最も長く使われていないテナントから解放します。
+回答キャッシュと質問の先読みはテナントごとに分かれており、他のテナントと共有しません。
+"""
+import sys
+import threading
+from collections import OrderedDict
+
+from ingest import load_documents
+from prefetch import Prefetcher
+from tenant_config import DEFAULT_TENANT_ID, load_tenant_configs
+
+# 同時に読み込んでおくテナント数の既定値
+DEFAULT_MAX_TENANTS = 4
+
+# テナントごとに保持する回答の数
+ANSWER_CACHE_SIZE = 128
+
+# チャンク1件あたりの本文以外のメモリ（Chunkオブジェクトとリストの参照）
+CHUNK_OVERHEAD = 64
+
+
+class AnswerCache:
+    """質問→回答のLRUキャッシュ"""
+
+    def __init__(self, max_entries=ANSWER_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, question):
+        with self._lock:
+            result = self._entries.get(question)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(question)
+            self.hits += 1
+            return result
+
+    def put(self, question, result):
+        with self._lock:
+            self._entries[question] = result
+            self._entries.move_to_end(question)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def estimate_size(documents):
+    """知識ベースのおおよそのメモリ使用量（バイト）"""
+    return sum(sys.getsizeof(doc.page_content) for doc in documents) + CHUNK_OVERHEAD * len(documents)
+
+
+class Tenant:
+    """読み込み済みのテナント（設定・知識ベース・回答キャッシュ・先読み）"""
+
+    def __init__(self, config, documents):
+        self.config = config
+        self.documents = documents
+        self.answers = AnswerCache()
+        self.prefetcher = Prefetcher(documents, config)
+        self.size_bytes = estimate_size(documents)
+
+    def close(self):
+        self.prefetcher.close()
+        self.answers.clear()
+
+
+class TenantRegistry:
+    """テナントの知識ベースを必要になった時点で読み込み、上限を超えたら古いものから解放する"""
+
+    def __init__(self, configs=None, max_tenants=DEFAULT_MAX_TENANTS, memory_budget_mb=None):
+        self.configs = configs if configs is not None else load_tenant_configs()
+        self.max_tenants = max_tenants
+        self.memory_budget = memory_budget_mb * 1024 * 1024 if memory_budget_mb else None
+        self._tenants = OrderedDict()
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    def get(self, tenant_id=DEFAULT_TENANT_ID):
+        """テナントを取得（未読み込みの場合は知識ベースを読み込む）"""
+        config = self.configs[tenant_id]
+
+        tenant = self.peek(tenant_id)
+        if tenant is not None:
+            return tenant
+
+        # 同じテナントの読み込みは1回だけ（他のテナントの処理は止めない）
+        with self._lock:
+            loading = self._loading.setdefault(tenant_id, threading.Lock())
+        with loading:
+            tenant = self.peek(tenant_id)
+            if tenant is not None:
+                return tenant
+            tenant = Tenant(config, load_documents(config.kb_path, tenant=config))
+            with self._lock:
+                self._tenants[tenant_id] = tenant
+                evicted = self._evict_over_limit()
+
+        for old in evicted:
+            old.close()
+        return tenant
+
+    def peek(self, tenant_id):
+        """読み込み済みのテナントのみ返す（未読み込みならNone）"""
+        with self._lock:
+            tenant = self._tenants.get(tenant_id)
+            if tenant is not None:
+                self._tenants.move_to_end(tenant_id)
+            return tenant
+
+    def prefetcher_for(self, tenant_id):
+        """読み込み済みのテナントの先読み（先読みのAPIから知識ベースを読み込ませないため）"""
+        tenant = self.peek(tenant_id)
+        return tenant.prefetcher if tenant is not None else None
+
+    def evict(self, tenant_id):
+        with self._lock:
+            tenant = self._tenants.pop(tenant_id, None)
+        if tenant is not None:
+            tenant.close()
+
+    def memory_bytes(self):
+        with self._lock:
+            return sum(tenant.size_bytes for tenant in self._tenants.values())
+
+    def _evict_over_limit(self):
+        # 直前に読み込んだテナント（末尾）は、単独で上限を超えていても残す
+        evicted = []
+        while len(self._tenants) > 1 and (
+                len(self._tenants) > self.max_tenants
+                or (self.memory_budget is not None
+                    and sum(t.size_bytes for t in self._tenants.values()) > self.memory_budget)):
+            _, tenant = self._tenants.popitem(last=False)
+            evicted.append(tenant)
+        return evicted
+
+    def stats(self):
+        """読み込み済みテナントごとのメモリ使用量と回答キャッシュの状況"""
+        with self._lock:
+            return {
+                tenant_id: {
+                    'size_mb': tenant.size_bytes / (1024 * 1024),
+                    'chunks': len(tenant.documents),
+                    'cached_answers': len(tenant.answers),
+                    'cache_hits': tenant.answers.hits,
+                    'cache_misses': tenant.answers.misses,
+                }
+                for tenant_id, tenant in self._tenants.items()
+            }